@@ -1,10 +1,11 @@
 import os
-import json
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional
 import glob
 
+import orjson
+
 def consolidate_source_data(raw_source_results: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     if not isinstance(raw_source_results, dict):
         logging.error("Consolidator: Input must be a dictionary.")
@@ -76,11 +77,11 @@ if __name__ == "__main__":
                 continue
 
             try:
-                with open(latest_file, 'r', encoding='utf-8') as f:
-                    data_package = json.load(f)
+                with open(latest_file, 'rb') as f:
+                    data_package = orjson.loads(f.read())
                 raw_results_from_files[key] = data_package
                 logging.info(f"Successfully loaded '{key}' package from {os.path.basename(latest_file)}")
-            except (json.JSONDecodeError, IOError) as e:
+            except (orjson.JSONDecodeError, IOError) as e:
                 logging.error(f"Failed to load or parse {latest_file}: {e}")
 
         if not raw_results_from_files:
@@ -94,8 +95,8 @@ if __name__ == "__main__":
                 filename = f"consolidated_report_{timestamp}.json"
                 filepath = os.path.join(EXPORT_DIR, filename)
 
-                with open(filepath, "w", encoding="utf-8") as f:
-                    json.dump(final_report_data, f, indent=4)
+                with open(filepath, "wb") as f:
+                    f.write(orjson.dumps(final_report_data, option=orjson.OPT_INDENT_2))
                 logging.info(f"Saved consolidated report to {filepath}")
             else:
                 logging.error("Test run FAILED: Consolidation returned a failure signal (None).")
\ No newline at end of file
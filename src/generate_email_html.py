@@ -1,20 +1,30 @@
 import os
-import json
+import re
 import logging
 import glob
 from datetime import datetime
+from functools import lru_cache
 from urllib.parse import quote_plus
 from typing import Dict, List, Optional
 
+import orjson
+
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
 def _sort_data_by_date(data: list, date_key: str) -> list:
+    # ISO dates sort the same as strings and as dates; anything else leaves the list unsorted, as a failed parse did.
+    dates = [x.get(date_key, '1900-01-01') for x in data]
+    if not all(isinstance(d, str) and _ISO_DATE_RE.fullmatch(d) for d in dates):
+        return data
+    return sorted(data, key=lambda x: x.get(date_key, '1900-01-01'), reverse=True)
+
+@lru_cache(maxsize=1024)
+def _format_short_date(date_str: str) -> str:
+    """Formats an ISO date as 'Mon DD'; rows share dates, so results are cached."""
     try:
-        return sorted(
-            data,
-            key=lambda x: datetime.strptime(x.get(date_key, '1900-01-01'), '%Y-%m-%d'),
-            reverse=True
-        )
+        return datetime.strptime(date_str, '%Y-%m-%d').strftime('%b %d')
     except (ValueError, TypeError):
-        return data
+        return 'N/A'
 
 def _make_google_search_link(company_name: str) -> str:
     """Creates a subtle Google Search link for the company name."""
@@ -70,12 +80,63 @@ def _format_summary_section(report_data: Dict) -> str:
     if not sources: return '<tr><td style="padding: 24px 20px;"><div style="background-color: #f9fafb; border-radius: 12px; padding: 32px; text-align: center;"><p style="font-size: 16px; color: #6b7280; margin: 0;">No new updates found in the monitored sources.</p></div></td></tr>'
     return f'<tr><td style="padding: 0 20px 24px 20px;"><div style="background-color: #fafafa; border-radius: 12px; padding: 24px;"><p style="font-size: 14px; color: #6b7280; margin: 0 0 16px 0; text-align: center; text-transform: uppercase; letter-spacing: 0.5px; font-weight: 600;">Summary of Updates</p><table border="0" cellpadding="0" cellspacing="0" width="100%"><tr>{"".join(sources)}</tr></table></div></td></tr>'
 
-def _generate_table_html(headers: List[str], data_items: List, row_formatter, color: str) -> str:
+_CELL_STYLES = {
+    "date": "padding: 10px; font-size: 13px; color: #6b7280; white-space: nowrap;",
+    "link_google": "padding: 10px; font-size: 14px; color: #374151; font-weight: 500;",
+    "plain": "padding: 10px; font-size: 13px; color: #6b7280;",
+    "mono": "padding: 10px; font-size: 11px; color: #6b7280; font-family: 'Courier New', monospace; text-align: left;",
+}
+
+def _is_initial_grant(item: Dict) -> bool:
+    cert_num = item.get('certificate_number', '')
+    # Logic: If it contains "Rev 00" (case insensitive), it is New.
+    return 'Rev 00' in cert_num or 'Rev 00' in cert_num.replace(" ", "")
+
+# Columns are (header, field, max_length, cell_kind); the date column and trailing link are implicit.
+SOURCE_SPECS = {
+    "edqm": {
+        "icon": "🇪🇺", "title": "EDQM Certificates", "color": "#3b82f6",
+        "date_field": "issue_date_cep", "link_field": "monograph_url",
+        "columns": [("Holder", "certificate_holder", None, "link_google"), ("Substance", "substance", None, "plain"), ("Cert #", "certificate_number", None, "mono")],
+        "groups": [
+            ('<h3 style="font-size: 13px; color: #059669; margin: 10px 0 8px 4px; text-transform: uppercase; letter-spacing: 0.5px; font-weight: 700;">✨ Initial Grants (Rev 00)</h3>', True),
+            ('<h3 style="font-size: 13px; color: #d97706; margin: 10px 0 8px 4px; text-transform: uppercase; letter-spacing: 0.5px; font-weight: 700;">📝 Revised Certificates</h3>', False),
+        ],
+        "group_by": _is_initial_grant,
+    },
+    "cdsco": {
+        "icon": "🇮🇳", "title": "CDSCO Written Confirmations", "color": "#f59e0b",
+        "date_field": "release_date", "link_field": "download_pdf_link",
+        "columns": [("Company", "company_name", None, "link_google"), ("Products", "products", 40, "plain")],
+    },
+    "fda": {
+        "icon": "🇺🇸", "title": "FDA Warning Letters", "color": "#ef4444",
+        "date_field": "posted_date", "link_field": "letter_url",
+        "columns": [("Company", "company_name", None, "link_google"), ("Office", "issuing_office", 30, "plain")],
+    },
+}
+
+def _format_table_row(item: Dict, i: int, spec: Dict) -> str:
+    cells = [f'<td style="{_CELL_STYLES["date"]}">{_format_short_date(item.get(spec["date_field"]))}</td>']
+    for _, field, max_length, kind in spec["columns"]:
+        value = item.get(field, 'N/A')
+        if max_length and len(value) > max_length:
+            value = f"{value[:max_length]}..."
+        if kind == "link_google":
+            value = _make_google_search_link(value)
+        cells.append(f'<td style="{_CELL_STYLES[kind]}">{value}</td>')
+    cells.append(f'<td style="padding: 10px; text-align: right;"><a href="{item.get(spec["link_field"], "#")}" target="_blank" style="color: {spec["color"]}; text-decoration: none; font-size: 18px; font-weight: bold;">→</a></td>')
+
+    bg_color = "#ffffff" if i % 2 == 0 else "#fafafa"
+    return f'<tr style="background-color: {bg_color};">{"".join(cells)}</tr>'
+
+def _generate_table_html(data_items: List, spec: Dict) -> str:
     """Helper to generate a table without the outer card container."""
     if not data_items:
         return ""
-        
-    rows_html = "".join(row_formatter(item, i, color) for i, item in enumerate(data_items))
+
+    rows_html = "".join(_format_table_row(item, i, spec) for i, item in enumerate(data_items))
+    headers = ["Date"] + [column[0] for column in spec["columns"]]
     header_html = "".join(f'<th style="padding: 10px; text-align: left; font-size: 11px; font-weight: 600; color: #6b7280; text-transform: uppercase;">{h}</th>' for h in headers)
     header_html += '<th style="width:20px;"></th>'
     
@@ -88,118 +149,43 @@ def _generate_table_html(headers: List[str], data_items: List, row_formatter, co
     </div>
     """
 
-def _create_section(title_icon: str, title_text: str, source_info: Dict, color: str, headers: List[str], row_formatter) -> str:
-    """Generic section creator for single-list sources (FDA/CDSCO)."""
+def _format_table_section(source_info: Dict, spec: Dict) -> str:
+    """Renders one source card from its SOURCE_SPECS entry, splitting into sub-tables when the spec defines groups."""
+    updates = _sort_data_by_date(source_info.get("updates", []), spec["date_field"])
     count = source_info.get("update_count", 0)
     source_url = source_info.get("source_url", "#")
-    updates = source_info.get("updates", [])
-    
-    table_html = _generate_table_html(headers, updates, row_formatter, color)
-    
-    return f"""
-    <tr><td style="padding-bottom: 24px;">
-        <div style="padding: 20px 20px 10px 20px;">
-            <table border="0" cellpadding="0" cellspacing="0" width="100%"><tr>
-                <td><h2 style="font-size: 18px; color: #1f2937; margin: 0; font-weight: 600;">{title_icon} {title_text}</h2></td>
-                <td style="text-align: right;"><span style="background-color: {color}; color: #ffffff; font-size: 12px; font-weight: 600; padding: 4px 12px; border-radius: 999px; text-decoration: none;">{count} NEW</span><a href="{source_url}" target="_blank" style="font-size: 12px; color: #667eea; text-decoration: none; margin-left: 12px; font-weight: 500;">View Source →</a></td>
-            </tr></table>
-        </div>
-        <div style="padding: 0 10px;">
-            {table_html}
-        </div>
-    </td></tr>
-    """
+    color = spec["color"]
+
+    groups = spec.get("groups")
+    if groups:
+        content_html = ""
+        for heading_html, group_value in groups:
+            group_items = [item for item in updates if spec["group_by"](item) == group_value]
+            if group_items:
+                content_html += heading_html
+                content_html += _generate_table_html(group_items, spec)
+        header_padding, body_padding = "20px 20px 0 20px", "5px 10px"
+    else:
+        content_html = _generate_table_html(updates, spec)
+        header_padding, body_padding = "20px 20px 10px 20px", "0 10px"
 
-def _format_edqm_section(source_info: Dict) -> str:
-    """Specific formatted for EDQM to handle the Split (New vs Revised)."""
-    updates = _sort_data_by_date(source_info.get("updates", []), 'issue_date_cep')
-    count = source_info.get("update_count", 0)
-    source_url = source_info.get("source_url", "#")
-    color = "#3b82f6"
-    
-    # Split Data
-    new_certs = []
-    revised_certs = []
-    
-    for item in updates:
-        cert_num = item.get('certificate_number', '')
-        # Logic: If it contains "Rev 00" (case insensitive), it is New.
-        if 'Rev 00' in cert_num or 'Rev 00' in cert_num.replace(" ", ""):
-            new_certs.append(item)
-        else:
-            revised_certs.append(item)
-
-    # Row Formatter (Reused for both tables)
-    def formatter(item, i, color):
-        date_str = datetime.strptime(item.get('issue_date_cep'), '%Y-%m-%d').strftime('%b %d') if item.get('issue_date_cep') else 'N/A'
-        holder = item.get('certificate_holder', 'N/A')
-        substance = item.get('substance', 'N/A')
-        cert_num = item.get('certificate_number', 'N/A')
-        
-        # Google Search Link
-        holder_html = _make_google_search_link(holder)
-        
-        bg_color = "#ffffff" if i % 2 == 0 else "#fafafa"
-        return f'<tr style="background-color: {bg_color};"><td style="padding: 10px; font-size: 13px; color: #6b7280; white-space: nowrap;">{date_str}</td><td style="padding: 10px; font-size: 14px; color: #374151; font-weight: 500;">{holder_html}</td><td style="padding: 10px; font-size: 13px; color: #6b7280;">{substance}</td><td style="padding: 10px; font-size: 11px; color: #6b7280; font-family: \'Courier New\', monospace; text-align: left;">{cert_num}</td><td style="padding: 10px; text-align: right;"><a href="{item.get("monograph_url", "#")}" target="_blank" style="color: {color}; text-decoration: none; font-size: 18px; font-weight: bold;">→</a></td></tr>'
-
-    headers = ["Date", "Holder", "Substance", "Cert #"]
-    
-    # Generate Blocks
-    content_html = ""
-    
-    if new_certs:
-        content_html += '<h3 style="font-size: 13px; color: #059669; margin: 10px 0 8px 4px; text-transform: uppercase; letter-spacing: 0.5px; font-weight: 700;">✨ Initial Grants (Rev 00)</h3>'
-        content_html += _generate_table_html(headers, new_certs, formatter, color)
-        
-    if revised_certs:
-        content_html += '<h3 style="font-size: 13px; color: #d97706; margin: 10px 0 8px 4px; text-transform: uppercase; letter-spacing: 0.5px; font-weight: 700;">📝 Revised Certificates</h3>'
-        content_html += _generate_table_html(headers, revised_certs, formatter, color)
-        
     if not content_html:
         content_html = '<p style="padding: 20px; text-align: center; color: #6b7280;">No data available.</p>'
 
     return f"""
     <tr><td style="padding-bottom: 24px;">
-        <div style="padding: 20px 20px 0 20px;">
+        <div style="padding: {header_padding};">
             <table border="0" cellpadding="0" cellspacing="0" width="100%"><tr>
-                <td><h2 style="font-size: 18px; color: #1f2937; margin: 0; font-weight: 600;">🇪🇺 EDQM Certificates</h2></td>
+                <td><h2 style="font-size: 18px; color: #1f2937; margin: 0; font-weight: 600;">{spec["icon"]} {spec["title"]}</h2></td>
                 <td style="text-align: right;"><span style="background-color: {color}; color: #ffffff; font-size: 12px; font-weight: 600; padding: 4px 12px; border-radius: 999px; text-decoration: none;">{count} NEW</span><a href="{source_url}" target="_blank" style="font-size: 12px; color: #667eea; text-decoration: none; margin-left: 12px; font-weight: 500;">View Source →</a></td>
             </tr></table>
         </div>
-        <div style="padding: 5px 10px;">
+        <div style="padding: {body_padding};">
             {content_html}
         </div>
     </td></tr>
     """
 
-def _format_cdsco_section(source_info: Dict) -> str:
-    source_info["updates"] = _sort_data_by_date(source_info.get("updates", []), 'release_date')
-    def formatter(item, i, color):
-        date_str = datetime.strptime(item.get('release_date'), '%Y-%m-%d').strftime('%b %d') if item.get('release_date') else 'N/A'
-        company = item.get('company_name', 'N/A')
-        products = item.get('products', 'N/A')
-        
-        # Google Search Link
-        company_html = _make_google_search_link(company)
-
-        bg_color = "#ffffff" if i % 2 == 0 else "#fafafa"
-        return f'<tr style="background-color: {bg_color};"><td style="padding: 10px; font-size: 13px; color: #6b7280; white-space: nowrap;">{date_str}</td><td style="padding: 10px; font-size: 14px; color: #374151; font-weight: 500;">{company_html}</td><td style="padding: 10px; font-size: 13px; color: #6b7280;">{products[:40]}{"..." if len(products) > 40 else ""}</td><td style="padding: 10px; text-align: right;"><a href="{item.get("download_pdf_link", "#")}" target="_blank" style="color: {color}; text-decoration: none; font-size: 18px; font-weight: bold;">→</a></td></tr>'
-    return _create_section("🇮🇳", "CDSCO Written Confirmations", source_info, "#f59e0b", ["Date", "Company", "Products"], formatter)
-
-def _format_fda_section(source_info: Dict) -> str:
-    source_info["updates"] = _sort_data_by_date(source_info.get("updates", []), 'posted_date')
-    def formatter(item, i, color):
-        date_str = datetime.strptime(item.get('posted_date'), '%Y-%m-%d').strftime('%b %d') if item.get('posted_date') else 'N/A'
-        company = item.get('company_name', 'N/A')
-        office = item.get('issuing_office', 'N/A')
-        
-        # Google Search Link
-        company_html = _make_google_search_link(company)
-
-        bg_color = "#ffffff" if i % 2 == 0 else "#fafafa"
-        return f'<tr style="background-color: {bg_color};"><td style="padding: 10px; font-size: 13px; color: #6b7280; white-space: nowrap;">{date_str}</td><td style="padding: 10px; font-size: 14px; color: #374151; font-weight: 500;">{company_html}</td><td style="padding: 10px; font-size: 13px; color: #6b7280;">{office[:30]}{"..." if len(office) > 30 else ""}</td><td style="padding: 10px; text-align: right;"><a href="{item.get("letter_url", "#")}" target="_blank" style="color: {color}; text-decoration: none; font-size: 18px; font-weight: bold;">→</a></td></tr>'
-    return _create_section("🇺🇸", "FDA Warning Letters", source_info, "#ef4444", ["Date", "Company", "Office"], formatter)
-
 def generate_html_report(consolidated_report: Dict) -> Optional[Dict[str, str]]:
     if not isinstance(consolidated_report, dict):
         logging.error("HTML Generator: Invalid data type for consolidated_report, expected dict.")
@@ -210,12 +196,11 @@ def generate_html_report(consolidated_report: Dict) -> Optional[Dict[str, str]]:
     subject = f"PharmaReg Intelligence | {total_updates} New Updates - {today_str}" if total_updates > 0 else f"PharmaReg Intelligence | {today_str} - No Updates"
 
     body_sections = [_format_header_section(), _format_dmf_section(consolidated_report), _format_summary_section(consolidated_report)]
-    source_formatters = {"edqm": _format_edqm_section, "cdsco": _format_cdsco_section, "fda": _format_fda_section}
     
     for source, data in consolidated_report.items():
         if isinstance(data, dict) and data.get("update_count", 0) > 0:
-            if source in source_formatters:
-                body_sections.append(source_formatters[source](data))
+            if source in SOURCE_SPECS:
+                body_sections.append(_format_table_section(data, SOURCE_SPECS[source]))
     
     html_template = """
     <!DOCTYPE html><html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0"><title>PharmaReg Intelligence Report</title></head><body style="margin: 0; padding: 0; background-color: #f3f4f6; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; -webkit-font-smoothing: antialiased;"><table border="0" cellpadding="0" cellspacing="0" width="100%" style="background-color: #f3f4f6;"><tr><td align="center" style="padding: 40px 0;"><table align="center" border="0" cellpadding="0" cellspacing="0" width="100%" style="max-width: 600px; background-color: #ffffff; border-radius: 12px; box-shadow: 0 1px 3px 0 rgba(0, 0, 0, 0.1), 0 1px 2px 0 rgba(0, 0, 0, 0.06); overflow: hidden;">
@@ -237,8 +222,8 @@ if __name__ == "__main__":
             raise FileNotFoundError("No consolidated report files found in exports/.")
         latest_file = max(list_of_files, key=os.path.getctime)
         
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            report_data = json.load(f)
+        with open(latest_file, 'rb') as f:
+            report_data = orjson.loads(f.read())
         logging.info(f"Loaded data from {os.path.basename(latest_file)}")
 
         email_package = generate_html_report(report_data)
@@ -247,12 +232,12 @@ if __name__ == "__main__":
             filename = f"email_preview_{timestamp}.html"
             filepath = os.path.join(EXPORT_DIR, filename)
             
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(email_package["html_body"])
+            with open(filepath, "wb") as f:
+                f.write(email_package["html_body"].encode("utf-8"))
             logging.info(f"SUCCESS: Email HTML generated and saved to {filepath}")
             logging.info(f"Subject: {email_package['subject']}")
         else:
             logging.error("FAILED: HTML generation returned None.")
             
-    except (FileNotFoundError, IndexError, json.JSONDecodeError) as e:
+    except (FileNotFoundError, IndexError, orjson.JSONDecodeError) as e:
         logging.error(f"Test run failed: Could not load test data. {e}")
\ No newline at end of file
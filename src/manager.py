@@ -1,5 +1,6 @@
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 from .sources import cdsco_source, edqm_source, fda_source, fda_dmf_source
@@ -25,39 +26,24 @@ def run_all_checks_and_notify():
         logging.error("MANAGER HALTING: No valid email addresses found in RECIPIENT_EMAILS.")
         return False
 
-    raw_results = {}
-
-    logging.info("Manager: Checking source [EDQM].")
-    edqm_updates = edqm_source.check_for_updates(days_to_check)
-    if edqm_updates is None:
-        logging.error("MANAGER HALTING: The EDQM source failed.")
-        return False
-    raw_results["edqm"] = edqm_updates
-    logging.info("Manager: EDQM check successful.")
-
-    logging.info("Manager: Checking source [CDSCO].")
-    cdsco_updates = cdsco_source.check_for_updates(days_to_check)
-    if cdsco_updates is None:
-        logging.error("MANAGER HALTING: The CDSCO source failed.")
-        return False
-    raw_results["cdsco"] = cdsco_updates
-    logging.info("Manager: CDSCO check successful.")
+    # Every source is network-bound, so fetch them side by side; results are still checked in order.
+    logging.info("Manager: Checking sources [EDQM, CDSCO, FDA Warning Letters, FDA DMF Details] concurrently.")
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        source_futures = {
+            "edqm": ("EDQM", executor.submit(edqm_source.check_for_updates, days_to_check)),
+            "cdsco": ("CDSCO", executor.submit(cdsco_source.check_for_updates, days_to_check)),
+            "fda": ("FDA Warning Letters", executor.submit(fda_source.check_for_updates, days_to_check)),
+            "fda_dmf": ("FDA DMF Details", executor.submit(fda_dmf_source.check_dmf_details)),
+        }
 
-    logging.info("Manager: Checking source [FDA Warning Letters].")
-    fda_updates = fda_source.check_for_updates(days_to_check)
-    if fda_updates is None:
-        logging.error("MANAGER HALTING: The FDA Warning Letters source failed.")
-        return False
-    raw_results["fda"] = fda_updates
-    logging.info("Manager: FDA check successful.")
-
-    logging.info("Manager: Checking source [FDA DMF Details].")
-    dmf_details = fda_dmf_source.check_dmf_details()
-    if dmf_details is None:
-        logging.error("MANAGER HALTING: The FDA DMF Details source failed.")
-        return False
-    raw_results["fda_dmf"] = dmf_details
-    logging.info("Manager: FDA DMF Details check successful.")
+    raw_results = {}
+    for source_key, (source_name, future) in source_futures.items():
+        source_result = future.result()
+        if source_result is None:
+            logging.error(f"MANAGER HALTING: The {source_name} source failed.")
+            return False
+        raw_results[source_key] = source_result
+        logging.info(f"Manager: {source_name} check successful.")
 
     logging.info("Manager: All sources successful. Handing off to Consolidator.")
     consolidated_report = consolidate_results.consolidate_source_data(raw_results)
@@ -1,4 +1,5 @@
 import os
+import re
 import logging
 import glob
 from typing import List
@@ -7,6 +8,13 @@ from dotenv import load_dotenv
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
+# Whitespace between tags and indentation left over from the HTML templates.
+_WS_RE = re.compile(r'>\s+<')
+_NL_RE = re.compile(r'\n\s*')
+
+def _minify_html(html_body: str) -> str:
+    return _NL_RE.sub(' ', _WS_RE.sub('><', html_body)).strip()
+
 def send_email(subject: str, html_body: str, recipient_emails: List[str]) -> bool:
     if not all([subject, html_body, isinstance(recipient_emails, list), recipient_emails]):
         logging.error("Email sender validation failed: Missing arguments or empty recipient list.")
@@ -18,11 +26,13 @@ def send_email(subject: str, html_body: str, recipient_emails: List[str]) -> boo
         logging.error("Email sender validation failed: SENDER_EMAIL or SENDGRID_API_KEY is not configured.")
         return False
 
+    # One personalization per recipient: a single API call, but each recipient gets their own To: line.
     message = Mail(
         from_email=sender_email,
         to_emails=recipient_emails,
         subject=subject,
-        html_content=html_body
+        html_content=_minify_html(html_body),
+        is_multiple=True
     )
 
     try:
@@ -1,40 +1,71 @@
 import os
-import json
 import logging
-import time
 import re
 from datetime import datetime, timedelta
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
+
+from . import html_slicing, http_session
 
 CDSCO_WC_URL = "https://cdsco.gov.in/opencms/en/International-cell1/"
 CDSCO_BASE_URL = "https://cdsco.gov.in"
 
+_MS_PREFIX_RE = re.compile(r'^M/s\.?\s*', re.IGNORECASE)
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+}
+
+_SESSION = http_session.make_session(HEADERS)
+
 def fetch_cdsco_html():
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    max_retries = 3
-    backoff_factor = 5
-
-    for attempt in range(max_retries):
-        try:
-            logging.info(f"Fetching CDSCO data from {CDSCO_WC_URL} (Attempt {attempt + 1}/{max_retries})")
-            response = requests.get(CDSCO_WC_URL, headers=headers, timeout=60)
-            response.raise_for_status()
-            logging.info(f"Successfully fetched {len(response.content)} bytes from CDSCO.")
-            return response.text
-        except requests.exceptions.RequestException as e:
-            logging.warning(f"Failed to fetch data from CDSCO on attempt {attempt + 1}: {e}")
-            if attempt < max_retries - 1:
-                sleep_time = backoff_factor * (attempt + 1)
-                logging.info(f"Waiting for {sleep_time} seconds before retrying...")
-                time.sleep(sleep_time)
-            else:
-                logging.error(f"All {max_retries} attempts to fetch data from CDSCO failed.", exc_info=True)
-                return None
-    return None
+    try:
+        logging.info(f"Fetching CDSCO data from {CDSCO_WC_URL}")
+        response = _SESSION.get(CDSCO_WC_URL, timeout=60)
+        response.raise_for_status()
+        # CDSCO serves UTF-8; declaring it up front skips requests' charset detection pass.
+        response.encoding = 'utf-8'
+        logging.info(f"Successfully fetched {len(response.content)} bytes from CDSCO (content-encoding: {response.headers.get('Content-Encoding', 'identity')}).")
+        return response.text
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to fetch data from CDSCO after retries: {e}", exc_info=True)
+        return None
+
+def iter_cdsco_records(html_content: str):
+    """Yields one record per data row of the CDSCO table. Raises ValueError if the page has no results table."""
+    if not html_content:
+        raise ValueError("Cannot parse empty HTML content.")
+
+    tree = lxml.html.fromstring(html_slicing.slice_table(html_content, 'id="example"'))
+    tables = tree.xpath('//table[@id="example"]')
+    if not tables:
+        raise ValueError("Could not find the CDSCO results table on the page.")
+
+    tbody = tables[0].find('tbody')
+    if tbody is None:
+        logging.warning("CDSCO table found, but it contains no body/data rows.")
+        return
+
+    for row in tbody.xpath('./tr'):
+        cells = row.xpath('./td')
+        if len(cells) == 7:
+            # Same output as BeautifulSoup's get_text(strip=True): each text node stripped, then joined.
+            s_no, wc_number, raw_company, products, released, _, pdf_size = ["".join(text.strip() for text in cell.itertext()) for cell in cells]
+            pdf_hrefs = cells[5].xpath('.//a/@href')
+
+            yield {
+                "release_date": released.split(" ")[0],
+                "s_no": s_no,
+                "wc_number": wc_number,
+                # CLEANING: Remove "M/s." or "M/s " prefix case-insensitively
+                "company_name": _MS_PREFIX_RE.sub('', raw_company),
+                "products": products,
+                "download_pdf_link": f"{CDSCO_BASE_URL}{pdf_hrefs[0]}" if pdf_hrefs and pdf_hrefs[0] else "",
+                "pdf_size": pdf_size,
+            }
 
 def parse_cdsco_table(html_content: str):
     if not html_content:
@@ -42,45 +73,17 @@ def parse_cdsco_table(html_content: str):
         return None
 
     try:
-        soup = BeautifulSoup(html_content, 'lxml')
-        table = soup.find('table', id='example')
-
-        if not table:
-            logging.error("Structural error: Could not find the CDSCO results table on the page.")
-            return None
-
-        parsed_data = []
-        tbody = table.find('tbody')
-        if not tbody:
-            logging.warning("CDSCO table found, but it contains no body/data rows.")
-            return []
-
-        data_rows = tbody.find_all('tr')
-        for row in data_rows:
-            cells = row.find_all('td')
-            if len(cells) == 7:
-                record = {"release_date": cells[4].get_text(strip=True).split(" ")[0]}
-                link_tag = cells[5].find('a')
-
-                record["s_no"] = cells[0].get_text(strip=True)
-                record["wc_number"] = cells[1].get_text(strip=True)
-                
-                # CLEANING: Remove "M/s." or "M/s " prefix case-insensitively
-                raw_company = cells[2].get_text(strip=True)
-                record["company_name"] = re.sub(r'^M/s\.?\s*', '', raw_company, flags=re.IGNORECASE)
-
-                record["products"] = cells[3].get_text(strip=True)
-                record["download_pdf_link"] = f"{CDSCO_BASE_URL}{link_tag['href']}" if link_tag else ""
-                record["pdf_size"] = cells[6].get_text(strip=True)
-
-                parsed_data.append(record)
-
-        logging.info(f"Successfully parsed {len(parsed_data)} CDSCO records.")
-        return parsed_data
+        parsed_data = list(iter_cdsco_records(html_content))
+    except ValueError as e:
+        logging.error(f"Structural error: {e}")
+        return None
     except Exception as e:
         logging.error(f"An unexpected error occurred during CDSCO HTML parsing: {e}", exc_info=True)
         return None
 
+    logging.info(f"Successfully parsed {len(parsed_data)} CDSCO records.")
+    return parsed_data
+
 def check_for_updates(days_to_check: int = 7):
     logging.info("Starting CDSCO update check.")
 
@@ -89,24 +92,24 @@ def check_for_updates(days_to_check: int = 7):
         logging.error("CDSCO check failed: could not fetch HTML.")
         return None
 
-    all_confirmations = parse_cdsco_table(html)
-    if all_confirmations is None:
-        logging.error("CDSCO check failed: could not parse table.")
-        return None
-
     recent_confirmations = []
-    cutoff_date = datetime.now() - timedelta(days=days_to_check)
-
-    for cert in all_confirmations:
-        release_date_str = cert.get("release_date")
-        if not release_date_str:
-            continue
-        try:
-            release_date = datetime.strptime(release_date_str, "%Y-%m-%d")
-            if release_date.date() >= cutoff_date.date():
+    # ISO dates order the same lexicographically and chronologically, so no per-row strptime is needed.
+    cutoff_str = (datetime.now() - timedelta(days=days_to_check)).strftime("%Y-%m-%d")
+
+    # Filter rows as the parser produces them instead of materializing the whole table first.
+    try:
+        for cert in iter_cdsco_records(html):
+            release_date_str = cert.get("release_date")
+            if not release_date_str:
+                continue
+            if not _ISO_DATE_RE.fullmatch(release_date_str):
+                logging.warning(f"Could not parse date '{release_date_str}'. Skipping record.")
+                continue
+            if release_date_str >= cutoff_str:
                 recent_confirmations.append(cert)
-        except ValueError:
-            logging.warning(f"Could not parse date '{release_date_str}'. Skipping record.")
+    except Exception as e:
+        logging.error(f"CDSCO check failed: could not parse table. {e}", exc_info=True)
+        return None
 
     logging.info(f"CDSCO check complete. Found {len(recent_confirmations)} updates in the last {days_to_check} days.")
     return {"data": recent_confirmations, "source_url": CDSCO_WC_URL}
@@ -128,8 +131,8 @@ if __name__ == "__main__":
         filename = f"cdsco_confirmations_{timestamp}.json"
         filepath = os.path.join(output_dir, filename)
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(result_package, f, indent=4)
+        with open(filepath, "wb") as f:
+            f.write(orjson.dumps(result_package, option=orjson.OPT_INDENT_2))
 
         logging.info(f"Saved package with {record_count} records to {filepath}")
     else:
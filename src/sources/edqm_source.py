@@ -1,15 +1,33 @@
 import os
-import json
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+from . import html_slicing, http_session
 
 BASE_URL = "https://extranet.edqm.eu/4DLink1/4DCGI/Query_CEP"
 MONOGRAPH_BASE_URL = "https://extranet.edqm.eu/4DLink1/4DCGI/Web_View/mono/"
 NO_RESULTS_TEXT = "No record matching your search query was found"
 
+# Only the date range changes between polls; the rest of the query string is encoded once.
+_QUERY_PREFIX = urlencode([
+    ("vSelectName", "5"), ("Case_TSE", "none"), ("vContains", "1"),
+    ("vContainsDate", "4"), ("vtsubName", ""), ("vtsubDateBegin", ""),
+])
+_QUERY_SUFFIX = urlencode([("SWTP", "1"), ("OK", "Search")])
+
+# The results table, matched by class token like the page's own CSS.
+_RESULTS_TABLE = etree.XPath('//table[contains(concat(" ", normalize-space(@class), " "), " table-scroll ")]')
+# Cells of a result row (class token "header"); yields nothing for detail rows. Compiled once, evaluated in libxml2.
+_HEADER_ROW_CELLS = etree.XPath('self::tr[contains(concat(" ", normalize-space(@class), " "), " header ")]/td')
+
+_SESSION = http_session.make_session()
+
 def fetch_edqm_html(days_ago: int):
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days_ago)
@@ -17,82 +35,98 @@ def fetch_edqm_html(days_ago: int):
     start_date_str = start_date.strftime("%d/%m/%Y")
     end_date_str = end_date.strftime("%d/%m/%Y")
 
-    params = {
-        "vSelectName": "5", "Case_TSE": "none", "vContains": "1",
-        "vContainsDate": "4", "vtsubName": "", "vtsubDateBegin": "",
-        "vtsubDateBtwBegin": start_date_str, "vtsubDateBtwEnd": end_date_str,
-        "SWTP": "1", "OK": "Search"
-    }
+    date_params = urlencode([("vtsubDateBtwBegin", start_date_str), ("vtsubDateBtwEnd", end_date_str)])
+    results_url = f"{BASE_URL}?{_QUERY_PREFIX}&{date_params}&{_QUERY_SUFFIX}"
 
     try:
-        session = requests.Session()
-        request = requests.Request('GET', BASE_URL, params=params)
-        prepared_request = session.prepare_request(request)
-        results_url = prepared_request.url
-
         logging.info(f"Fetching EDQM data from {results_url}")
-        response = session.send(prepared_request, timeout=60)
+        response = _SESSION.get(results_url, timeout=60)
         response.raise_for_status()
 
-        logging.info(f"Successfully fetched {len(response.content)} bytes from EDQM.")
+        logging.info(f"Successfully fetched {len(response.content)} bytes from EDQM (content-encoding: {response.headers.get('Content-Encoding', 'identity')}).")
         return response.text, results_url
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to fetch recent data from EDQM: {e}", exc_info=True)
         return None, None
 
+def _iso_from_dmy(value: str) -> str | None:
+    """dd/mm/yyyy -> yyyy-mm-dd, or None if `value` is not a valid date in that format."""
+    # Zero-padded dates are sliced, with the calendar check strptime would do; anything else goes through strptime.
+    if len(value) == 10 and value[2] == '/' and value[5] == '/' and (value[:2] + value[3:5] + value[6:]).isdigit():
+        try:
+            date(int(value[6:]), int(value[3:5]), int(value[:2]))
+        except ValueError:
+            return None
+        return f"{value[6:]}-{value[3:5]}-{value[:2]}"
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+def iter_edqm_records(html_content: str):
+    """Yields one record per EDQM result row. Raises ValueError if the page has neither results nor a 'no results' message."""
+    if not html_content:
+        raise ValueError("Cannot parse empty HTML content.")
+
+    if NO_RESULTS_TEXT in html_content:
+        logging.info("EDQM page confirms zero results for the selected period.")
+        return
+
+    # Without the table's class anywhere in the page there is nothing to parse.
+    if 'table-scroll' not in html_content:
+        raise ValueError("EDQM results table is missing and no 'no results' message was found.")
+
+    column_headers = [
+        "monograph_number", "substance", "type_cep", "certificate_holder",
+        "holder_spor_id", "certificate_number", "issue_date_cep",
+        "status_cep", "renewal_due", "end_date_cep", "closure_date_of_last_procedure"
+    ]
+
+    tree = lxml.html.fromstring(html_slicing.slice_table(html_content, 'table-scroll'))
+    tables = _RESULTS_TABLE(tree)
+    if not tables:
+        raise ValueError("EDQM results table is missing and no 'no results' message was found.")
+
+    tbody = tables[0].find('tbody')
+    if tbody is None:
+        logging.warning("EDQM table found, but it contains no body/data rows.")
+        return
+
+    for row in tbody.xpath('./tr'):
+        cells = _HEADER_ROW_CELLS(row)
+        if len(cells) == len(column_headers):
+            # Same output as BeautifulSoup's get_text(strip=True): each text node stripped, then joined.
+            cell_texts = ["".join(text.strip() for text in cell.itertext()) for cell in cells]
+            record = dict(zip(column_headers, cell_texts))
+
+            if record.get("monograph_number"):
+                record["monograph_url"] = f"{MONOGRAPH_BASE_URL}{record['monograph_number']}"
+
+            iso_issue_date = _iso_from_dmy(record["issue_date_cep"])
+            if iso_issue_date is not None:
+                record["issue_date_cep"] = iso_issue_date
+            else:
+                logging.warning(f"Could not parse date for EDQM record: {record.get('certificate_number')}. Skipping date formatting.")
+
+            yield record
+
 def parse_edqm_table(html_content: str):
     if not html_content:
         logging.error("Cannot parse empty HTML content.")
         return None
 
     try:
-        soup = BeautifulSoup(html_content, 'lxml')
-        table = soup.find('table', class_='table-scroll')
-
-        if not table:
-            if NO_RESULTS_TEXT in html_content:
-                logging.info("EDQM page confirms zero results for the selected period.")
-                return []
-            else:
-                logging.error("Structural error: EDQM results table is missing and no 'no results' message was found.")
-                return None
-
-        column_headers = [
-            "monograph_number", "substance", "type_cep", "certificate_holder",
-            "holder_spor_id", "certificate_number", "issue_date_cep",
-            "status_cep", "renewal_due", "end_date_cep", "closure_date_of_last_procedure"
-        ]
-
-        parsed_data = []
-        tbody = table.find('tbody')
-        if not tbody:
-            logging.warning("EDQM table found, but it contains no body/data rows.")
-            return []
-
-        data_rows = tbody.find_all('tr', class_='header')
-        for row in data_rows:
-            cells = row.find_all('td')
-            if len(cells) == len(column_headers):
-                cell_texts = [cell.get_text(strip=True) for cell in cells]
-                record = dict(zip(column_headers, cell_texts))
-
-                if record.get("monograph_number"):
-                    record["monograph_url"] = f"{MONOGRAPH_BASE_URL}{record['monograph_number']}"
-
-                try:
-                    date_obj = datetime.strptime(record["issue_date_cep"], "%d/%m/%Y")
-                    record["issue_date_cep"] = date_obj.strftime("%Y-%m-%d")
-                except (ValueError, KeyError):
-                    logging.warning(f"Could not parse date for EDQM record: {record.get('certificate_number')}. Skipping date formatting.")
-
-                parsed_data.append(record)
-
-        logging.info(f"Successfully parsed {len(parsed_data)} EDQM records.")
-        return parsed_data
+        parsed_data = list(iter_edqm_records(html_content))
+    except ValueError as e:
+        logging.error(f"Structural error: {e}")
+        return None
     except Exception as e:
         logging.error(f"An unexpected error occurred during EDQM HTML parsing: {e}", exc_info=True)
         return None
 
+    logging.info(f"Successfully parsed {len(parsed_data)} EDQM records.")
+    return parsed_data
+
 def check_for_updates(days_to_check: int = 3):
     logging.info("Starting EDQM update check.")
 
@@ -126,8 +160,8 @@ if __name__ == "__main__":
         filename = f"edqm_certificates_{timestamp}.json"
         filepath = os.path.join(output_dir, filename)
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(result_package, f, indent=4)
+        with open(filepath, "wb") as f:
+            f.write(orjson.dumps(result_package, option=orjson.OPT_INDENT_2))
 
         logging.info(f"Saved package with {record_count} records to {filepath}")
     else:
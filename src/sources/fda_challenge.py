@@ -0,0 +1,131 @@
+import os
+import logging
+import time
+import re
+import hashlib
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import orjson
+import requests
+
+# Solved challenge cookies are reused by later processes on the same disk while younger than this.
+AUTH_CACHE_TTL_SECONDS = 4 * 60 * 60
+
+# Both challenge variables in one alternation, so the page is scanned once: group 1 is the salt, group 2 the candidates.
+# Bytes pattern, run on response.content so the challenge page is never decoded as a whole.
+_CHALLENGE_VARS_RE = re.compile(rb'let public_salt = "([^"]+)";|candidates = "([^"]+)".split')
+
+# Concurrent checks share a source's session: serializes loading cached cookies into it and writing the solved pair.
+_COOKIE_LOCK = threading.Lock()
+
+# --- HELPER: AUTH COOKIE CACHE ---
+def _load_auth_cookies(cache_path: str) -> dict:
+    """Returns the challenge cookies saved by an earlier run, or {} if there are none younger than AUTH_CACHE_TTL_SECONDS."""
+    try:
+        with open(cache_path, "rb") as f:
+            cached = orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+    if not isinstance(cached, dict) or time.time() - cached.get("saved_at", 0) > AUTH_CACHE_TTL_SECONDS:
+        return {}
+    return cached.get("cookies") or {}
+
+def _save_auth_cookies(cache_path: str, cookies: dict) -> None:
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"saved_at": time.time(), "cookies": cookies}))
+        # Atomic swap: concurrent workers never read a half-written file, the last writer wins.
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not write FDA auth cookie cache to {cache_path}: {e}")
+
+# --- HELPER: CHALLENGE SOLVER ---
+@lru_cache(maxsize=128)
+def _compute_sha256_pair(public_salt: str, candidate_1: str, candidate_2: str) -> tuple[str, str]:
+    """Mimics the JS SHA256(salt + candidate) calls in FDA's abuse deterrent script. Cached: the salt repeats while a challenge is live."""
+    # Absorb the salt once and branch the hash state for each candidate.
+    salted = hashlib.sha256(public_salt.encode('utf-8'))
+    digest_1, digest_2 = salted.copy(), salted
+    digest_1.update(candidate_1.encode('utf-8'))
+    digest_2.update(candidate_2.encode('utf-8'))
+    return digest_1.hexdigest().upper(), digest_2.hexdigest().upper()
+
+def _extract_challenge_vars(html_bytes: bytes):
+    """Returns (public_salt, candidates) from a single pass over the page; either is None if missing."""
+    public_salt = candidates = None
+    for match in _CHALLENGE_VARS_RE.finditer(html_bytes):
+        if match.group(1) is not None:
+            public_salt = public_salt or match.group(1).decode('utf-8')
+        else:
+            candidates = candidates or match.group(2).decode('utf-8')
+        if public_salt and candidates:
+            break
+    return public_salt, candidates
+
+def solve_challenge_and_get_session(
+    session: requests.Session,
+    page_url: str,
+    auth_cache_path: str,
+    page_name: str,
+    headers: dict | None = None,
+) -> tuple[requests.Session | None, requests.Response | None]:
+    """
+    Readies `session` for an FDA page. If the 'abuse-deterrent' challenge is detected,
+    it solves the math puzzle, sets cookies, and authorizes the session.
+    Returns (session, response); response is the handshake response when it already
+    is the page (200 without a challenge, or 304 for conditional `headers`), and None when it must be refetched.
+    """
+    domain = urlparse(page_url).netloc
+
+    # A fresh process starts without cookies; reuse the ones an earlier run solved so the handshake gets the page directly.
+    with _COOKIE_LOCK:
+        if session.cookies.get("authorization_1", domain=domain) is None:
+            for name, value in _load_auth_cookies(auth_cache_path).items():
+                session.cookies.set(name, value, domain=domain)
+
+    try:
+        logging.info(f"Initiating handshake with {page_name}...")
+        response = session.get(page_url, headers=headers, timeout=30)
+
+        # Case A: No challenge (304 Not Modified, or 200 OK and clean HTML)
+        # The challenge script is loaded from <head>, so the first 8 KB of raw bytes decide it without decoding the page.
+        if response.status_code == 304 or (response.status_code == 200 and b"abuse-deterrent.js" not in response.content[:8192]):
+            logging.info("No challenge detected. Session is ready.")
+            return session, response
+
+        # Case B: Challenge Detected
+        page_bytes = response.content
+        if b"abuse-deterrent.js" in page_bytes or b"public_salt" in page_bytes:
+            logging.info("Abuse deterrent challenge detected. Attempting to solve...")
+
+            # Extract variables
+            public_salt, raw_candidates = _extract_challenge_vars(page_bytes)
+
+            if not public_salt or not raw_candidates:
+                logging.error("Could not extract challenge variables from HTML.")
+                return None, None
+
+            candidates = raw_candidates.split('/')
+
+            # Solve puzzle
+            auth_1, auth_2 = _compute_sha256_pair(public_salt, candidates[0], candidates[1])
+
+            # Set cookies on the domain
+            with _COOKIE_LOCK:
+                session.cookies.set("authorization_1", auth_1, domain=domain)
+                session.cookies.set("authorization_2", auth_2, domain=domain)
+
+            _save_auth_cookies(auth_cache_path, {"authorization_1": auth_1, "authorization_2": auth_2})
+            logging.info("Challenge solved. Authorization cookies set.")
+            return session, None
+
+        logging.warning(f"Unexpected response: {response.status_code}")
+        return None, None
+
+    except Exception as e:
+        logging.error(f"Error during session initialization: {e}", exc_info=True)
+        return None, None
@@ -1,19 +1,32 @@
 import os
-import json
 import logging
-import time
-import re
-import hashlib
 from datetime import datetime
-from urllib.parse import urlparse
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+from . import fda_challenge, http_session
 
 # --- CONFIGURATION ---
 FDA_DMF_URL = "https://www.fda.gov/drugs/drug-master-files-dmfs/list-drug-master-files-dmfs"
 FDA_BASE_URL = "https://www.fda.gov"
 
+# Validators and parsed details from the last successful fetch, for conditional GETs.
+DMF_CACHE_PATH = os.path.join("exports", ".fda_dmf_cache.json")
+
+# The page is ~1 MB but only two elements are read; these run against small slices of it (see _slice_element).
+_UPDATE_DATETIME_XPATH = etree.XPath('//li[contains(concat(" ", normalize-space(@class), " "), " node-current-date ")]//time/@datetime')
+# Pages without the node-current-date item carry the date under a "Content current as of:" heading instead.
+_CURRENT_AS_OF_DATETIME_XPATH = etree.XPath('//h2[contains(normalize-space(.), "Content current as of:")]/following::time[1]/@datetime')
+_EXCEL_HREF_XPATH = etree.XPath('//a[contains(translate(normalize-space(.), "EXCEL", "excel"), "excel")]/@href')
+# Last resort when no anchor text mentions Excel: a link straight to a workbook.
+_XLSX_HREF_XPATH = etree.XPath('//a[substring(translate(@href, "XLS", "xls"), string-length(@href) - 4) = ".xlsx"]/@href')
+
+# Solved challenge cookies for this page, reused across processes by fda_challenge.
+AUTH_CACHE_PATH = os.path.join("exports", ".fda_dmf_auth_cache.json")
+
 # Standard browser headers
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
@@ -21,92 +34,107 @@ HEADERS = {
     'Accept-Language': 'en-US,en;q=0.9',
 }
 
+_SESSION = http_session.make_session(HEADERS)
+
 # --- HELPER: CHALLENGE SOLVER ---
-def _compute_sha256(text: str) -> str:
-    """Mimics the JS SHA256 function found in FDA's abuse deterrent script."""
-    return hashlib.sha256(text.encode('utf-8')).hexdigest().upper()
-
-def _solve_challenge_and_get_session() -> requests.Session | None:
-    """
-    Initiates a session. If the FDA 'abuse-deterrent' challenge is detected,
-    it solves the math puzzle, sets cookies, and authorizes the session.
-    """
-    session = requests.Session()
-    session.headers.update(HEADERS)
+def _solve_challenge_and_get_session(conditional_headers: dict | None = None) -> tuple[requests.Session | None, requests.Response | None]:
+    """Readies the shared session; see fda_challenge. The response, if any, is the DMF page (200) or a 304."""
+    return fda_challenge.solve_challenge_and_get_session(_SESSION, FDA_DMF_URL, AUTH_CACHE_PATH, "FDA DMF Page", headers=conditional_headers)
 
+# --- HELPER: CONDITIONAL GET CACHE ---
+def _load_dmf_cache() -> dict:
     try:
-        logging.info(f"Initiating handshake with FDA DMF Page...")
-        response = session.get(FDA_DMF_URL, timeout=30)
-
-        # Case A: No challenge (200 OK and clean HTML)
-        if response.status_code == 200 and "abuse-deterrent.js" not in response.text:
-            logging.info("No challenge detected. Session is ready.")
-            return session
-
-        # Case B: Challenge Detected
-        if "abuse-deterrent.js" in response.text or "public_salt" in response.text:
-            logging.info("Abuse deterrent challenge detected. Attempting to solve...")
-
-            # Extract variables
-            salt_match = re.search(r'let public_salt = "([^"]+)";', response.text)
-            candidates_match = re.search(r'candidates = "([^"]+)".split', response.text)
-
-            if not salt_match or not candidates_match:
-                logging.error("Could not extract challenge variables from HTML.")
-                return None
-
-            public_salt = salt_match.group(1)
-            candidates = candidates_match.group(1).split('/')
-
-            # Solve puzzle
-            auth_1 = _compute_sha256(public_salt + candidates[0])
-            auth_2 = _compute_sha256(public_salt + candidates[1])
-
-            # Set cookies on the domain
-            domain = urlparse(FDA_DMF_URL).netloc
-            session.cookies.set("authorization_1", auth_1, domain=domain)
-            session.cookies.set("authorization_2", auth_2, domain=domain)
-
-            logging.info("Challenge solved. Authorization cookies set.")
-            return session
-        
-        logging.warning(f"Unexpected response: {response.status_code}")
-        return None
-
-    except Exception as e:
-        logging.error(f"Error during session initialization: {e}", exc_info=True)
+        with open(DMF_CACHE_PATH, "rb") as f:
+            return orjson.loads(f.read())
+    except (OSError, orjson.JSONDecodeError):
+        return {}
+
+def _save_dmf_cache(response: requests.Response, details: dict) -> None:
+    cache = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "details": details,
+    }
+    if not cache["etag"] and not cache["last_modified"]:
+        return
+    try:
+        os.makedirs(os.path.dirname(DMF_CACHE_PATH), exist_ok=True)
+        with open(DMF_CACHE_PATH, "wb") as f:
+            f.write(orjson.dumps(cache))
+    except OSError as e:
+        logging.warning(f"Could not write FDA DMF cache to {DMF_CACHE_PATH}: {e}")
+
+def _slice_element(page: bytes, offset: int, open_tag: bytes, close_tag: bytes) -> slice | None:
+    """Returns the span of the element enclosing `offset`, from the nearest preceding `open_tag` through the next `close_tag`."""
+    open_idx = page.rfind(open_tag, 0, offset)
+    # Skip longer tag names sharing the prefix (<link> for <li, <abbr> for <a).
+    while open_idx != -1 and page[open_idx + len(open_tag):open_idx + len(open_tag) + 1] not in b' \t\r\n\f/>':
+        open_idx = page.rfind(open_tag, 0, open_idx)
+    close_idx = page.find(close_tag, offset)
+    if open_idx == -1 or close_idx == -1 or page.find(close_tag, open_idx, offset) != -1:
         return None
-
-def parse_dmf_page_details(html_content: str):
+    return slice(open_idx, close_idx + len(close_tag))
+
+def _find_excel_hrefs(page: bytes, parser: lxml.html.HTMLParser) -> list:
+    """Parses only the anchors whose markup mentions 'excel', in document order."""
+    page_lower = page.lower()
+    idx = page_lower.find(b'excel')
+    while idx != -1:
+        anchor = _slice_element(page_lower, idx, b'<a', b'</a>')
+        if anchor is not None:
+            hrefs = _EXCEL_HREF_XPATH(lxml.html.fromstring(page[anchor], parser=parser))
+            if hrefs:
+                return hrefs
+        idx = page_lower.find(b'excel', idx + 1)
+    return []
+
+def parse_dmf_page_details(html_content: str | bytes, encoding: str = 'utf-8'):
+    """`encoding` is the charset of bytes input; slices of the page no longer carry its <meta charset>."""
     if not html_content:
         logging.error("Cannot parse empty HTML content.")
         return None
 
     try:
-        # Use html.parser for stability in Cloud Run
-        soup = BeautifulSoup(html_content, 'html.parser')
+        if isinstance(html_content, str):
+            page, encoding = html_content.encode('utf-8'), 'utf-8'
+        else:
+            page = html_content
+        slice_parser = lxml.html.HTMLParser(encoding=encoding)
         details = {}
 
         # 1. Extract Update Date
         # Selector: li.node-current-date time
-        # We look for a <time> tag inside an <li> with that class
-        date_container = soup.find('li', class_='node-current-date')
-        time_tag = date_container.find('time') if date_container else None
+        # We read the datetime attribute of a <time> tag inside an <li> with that class,
+        # parsing just that <li> when it can be cut out of the page, the whole page otherwise
+        update_datetimes = []
+        doc = None
+        marker_idx = page.find(b'node-current-date')
+        date_span = _slice_element(page, marker_idx, b'<li', b'</li>') if marker_idx != -1 else None
+        if date_span is not None:
+            update_datetimes = _UPDATE_DATETIME_XPATH(lxml.html.fromstring(page[date_span], parser=slice_parser))
+        if not update_datetimes:
+            doc = lxml.html.fromstring(page)
+            update_datetimes = _UPDATE_DATETIME_XPATH(doc)
+            if not update_datetimes:
+                # Fallback: the first <time> after the "Content current as of:" heading
+                logging.warning("Could not find standard 'node-current-date' time tag. Attempting fallback...")
+                update_datetimes = _CURRENT_AS_OF_DATETIME_XPATH(doc)
         
-        if time_tag and time_tag.has_attr('datetime'):
-            details['update_date'] = time_tag['datetime'].split('T')[0]
+        if update_datetimes:
+            details['update_date'] = update_datetimes[0][:10]
         else:
-            # Fallback: Try to find date text in the header area
-            logging.warning("Could not find standard 'node-current-date' time tag. Attempting fallback...")
-            # (Optional: Add fallback logic here if needed, currently sticking to standard)
+            logging.error("Structural error: Could not find the update date on the page.")
             return None
 
         # 2. Extract Excel Download Link
-        # Look for <a> containing text 'excel' (case insensitive)
-        excel_link_tag = soup.find('a', string=lambda text: text and 'excel' in text.lower())
+        # Look for <a> containing text 'excel' (case insensitive), again falling back to the whole page
+        excel_hrefs = _find_excel_hrefs(page, slice_parser)
+        if not excel_hrefs:
+            doc = doc if doc is not None else lxml.html.fromstring(page)
+            excel_hrefs = _EXCEL_HREF_XPATH(doc) or _XLSX_HREF_XPATH(doc)
         
-        if excel_link_tag and excel_link_tag.has_attr('href'):
-            href = excel_link_tag['href']
+        if excel_hrefs:
+            href = excel_hrefs[0]
             if href.startswith("http"):
                 details['download_url'] = href
             else:
@@ -123,27 +151,44 @@ def parse_dmf_page_details(html_content: str):
 def check_dmf_details():
     logging.info("Starting FDA DMF List details check.")
     
-    # 1. Get Authorized Session
-    session = _solve_challenge_and_get_session()
+    # 1. Load validators from the last successful fetch
+    cache = _load_dmf_cache()
+    conditional_headers = {}
+    if cache.get("details"):
+        if cache.get("etag"):
+            conditional_headers["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            conditional_headers["If-Modified-Since"] = cache["last_modified"]
+
+    # 2. Get Authorized Session (the handshake is conditional too, so an unchanged page costs one empty 304)
+    session, response = _solve_challenge_and_get_session(conditional_headers)
     if not session:
         logging.error("FDA DMF check failed: Could not initialize authorized session.")
         return None
 
-    # 2. Fetch Page
+    # 3. Fetch Page, unless the handshake already returned it
     try:
-        logging.info("Fetching FDA DMF page content...")
-        response = session.get(FDA_DMF_URL, timeout=60)
+        if response is None:
+            logging.info("Fetching FDA DMF page content...")
+            response = session.get(FDA_DMF_URL, headers=conditional_headers, timeout=60)
+        if response.status_code == 304:
+            logging.info(f"FDA DMF page unchanged since last fetch. Using cached details: {cache['details']}")
+            return cache["details"]
         response.raise_for_status()
-        html_content = response.text
+        # Raw bytes: lxml reads the page's <meta charset> itself, so requests never has to decode the body.
+        html_content = response.content
+        # Only a declared HTTP charset is passed on; requests' ISO-8859-1 default for text/* would misread FDA's UTF-8.
+        encoding = response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else 'utf-8'
     except Exception as e:
         logging.error(f"FDA DMF check failed during fetch: {e}")
         return None
 
-    # 3. Parse
-    details = parse_dmf_page_details(html_content)
+    # 4. Parse
+    details = parse_dmf_page_details(html_content, encoding or 'utf-8')
     if details is None:
         logging.error("FDA DMF check failed: could not parse page details.")
         return None
+    _save_dmf_cache(response, details)
 
     logging.info(f"FDA DMF check successful. Found details: {details}")
     return details
@@ -166,8 +211,8 @@ if __name__ == "__main__":
         filename = f"fda_dmf_details_{timestamp}.json"
         filepath = os.path.join(output_dir, filename)
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(dmf_details, f, indent=4)
+        with open(filepath, "wb") as f:
+            f.write(orjson.dumps(dmf_details, option=orjson.OPT_INDENT_2))
 
         logging.info(f"Saved details to {filepath}")
     else:
@@ -1,20 +1,27 @@
 import os
-import json
 import logging
 import time
 import re
-import hashlib
+import html
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+from . import fda_challenge, http_session
 
 # --- CONFIGURATION ---
 FDA_AJAX_URL = "https://www.fda.gov/datatables/views/ajax"
 FDA_WL_PAGE_URL = "https://www.fda.gov/inspections-compliance-enforcement-and-criminal-investigations/compliance-actions-and-activities/warning-letters"
 FDA_BASE_URL = "https://www.fda.gov"
 
+# Solved challenge cookies for this page, reused across processes by fda_challenge.
+AUTH_CACHE_PATH = os.path.join("exports", ".fda_wl_auth_cache.json")
+# Drupal keeps a view_dom_id valid while the session is; within this window checks reuse it and skip the landing page.
+DOM_ID_TTL_SECONDS = 30 * 60
+
 # Standard headers
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
@@ -22,71 +29,41 @@ HEADERS = {
     'Accept-Language': 'en-US,en;q=0.9',
 }
 
-# --- HELPER: CHALLENGE SOLVER ---
-def _compute_sha256(text: str) -> str:
-    """Mimics the JS SHA256 function found in FDA's abuse deterrent script."""
-    return hashlib.sha256(text.encode('utf-8')).hexdigest().upper()
-
-def _solve_challenge_and_get_session() -> requests.Session | None:
-    """
-    Initiates a session. If the FDA 'abuse-deterrent' challenge is detected,
-    it solves the math puzzle, sets cookies, and authorizes the session.
-    """
-    session = requests.Session()
-    session.headers.update(HEADERS)
-
-    try:
-        logging.info("Initiating handshake with FDA Landing Page...")
-        response = session.get(FDA_WL_PAGE_URL, timeout=30)
-
-        # Case A: No challenge (200 OK and clean HTML)
-        if response.status_code == 200 and "abuse-deterrent.js" not in response.text:
-            logging.info("No challenge detected. Session is ready.")
-            return session
-
-        # Case B: Challenge Detected
-        if "abuse-deterrent.js" in response.text or "public_salt" in response.text:
-            logging.info("Abuse deterrent challenge detected. Attempting to solve...")
-
-            # Extract variables
-            salt_match = re.search(r'let public_salt = "([^"]+)";', response.text)
-            candidates_match = re.search(r'candidates = "([^"]+)".split', response.text)
-
-            if not salt_match or not candidates_match:
-                logging.error("Could not extract challenge variables from HTML.")
-                return None
-
-            public_salt = salt_match.group(1)
-            candidates = candidates_match.group(1).split('/')
+# Bytes pattern: the landing page is searched without decoding it.
+_DOM_ID_RE = re.compile(rb'js-view-dom-id-([a-zA-Z0-9]+)')
 
-            # Solve puzzle
-            auth_1 = _compute_sha256(public_salt + candidates[0])
-            auth_2 = _compute_sha256(public_salt + candidates[1])
+# Drupal renders the date and company cells as one bare <time> or <a>; cells of exactly that shape skip the HTML parser.
+_TIME_CELL_RE = re.compile(r'<time\s(?:[^>]*?\s)?datetime="([^"]*)"[^>]*>[^<]*</time>')
+_ANCHOR_CELL_RE = re.compile(r'<a\s(?:[^>]*?\s)?href="([^"]*)"[^>]*>([^<]*)</a>')
+# Lookups for cells that do not match those shapes, compiled once instead of per row.
+_FIRST_TIME_DATETIME_XPATH = etree.XPath('(.//time)[1]/@datetime')
+_FIRST_ANCHOR_XPATH = etree.XPath('(.//a)[1]')
 
-            # Set cookies
-            domain = urlparse(FDA_WL_PAGE_URL).netloc
-            session.cookies.set("authorization_1", auth_1, domain=domain)
-            session.cookies.set("authorization_2", auth_2, domain=domain)
+# Headers the browser adds to the DataTables XHR; sent per request so the shared session's landing-page GETs stay plain.
+AJAX_HEADERS = {
+    'X-Requested-With': 'XMLHttpRequest',
+    'Referer': FDA_WL_PAGE_URL,
+    'Origin': FDA_BASE_URL,
+}
 
-            logging.info("Challenge solved. Authorization cookies set.")
-            return session
-        
-        logging.warning(f"Unexpected response: {response.status_code}")
-        return None
+_SESSION = http_session.make_session(HEADERS)
+# (view_dom_id, expires_at) from the last landing page read; reset when the AJAX endpoint rejects it.
+_DOM_ID_CACHE: tuple[str, float] | None = None
 
-    except Exception as e:
-        logging.error(f"Error during session initialization: {e}", exc_info=True)
-        return None
+# --- HELPER: CHALLENGE SOLVER ---
+def _solve_challenge_and_get_session() -> tuple[requests.Session | None, requests.Response | None]:
+    """Readies the shared session; see fda_challenge. The response, if any, is the landing page."""
+    return fda_challenge.solve_challenge_and_get_session(_SESSION, FDA_WL_PAGE_URL, AUTH_CACHE_PATH, "FDA Landing Page")
 
 # --- HELPER: PARSERS ---
-def _extract_view_dom_id(session: requests.Session) -> str | None:
-    """Fetches the landing page to extract the dynamic Drupal view ID."""
+def _extract_view_dom_id(session: requests.Session, landing_response: requests.Response | None = None) -> str | None:
+    """Extracts the dynamic Drupal view ID from the landing page, fetching it only if the handshake did not already."""
     try:
         # Note: We use the authorized session here
-        response = session.get(FDA_WL_PAGE_URL, timeout=30)
-        match = re.search(r'js-view-dom-id-([a-zA-Z0-9]+)', response.text)
+        response = landing_response if landing_response is not None else session.get(FDA_WL_PAGE_URL, timeout=30)
+        match = _DOM_ID_RE.search(response.content)
         if match:
-            dom_id = match.group(1)
+            dom_id = match.group(1).decode('ascii')
             logging.info(f"Successfully extracted view_dom_id: {dom_id}")
             return dom_id
     except Exception:
@@ -94,6 +71,120 @@ def _extract_view_dom_id(session: requests.Session) -> str | None:
     logging.warning("Could not extract view_dom_id. API calls may fail.")
     return None
 
+def _authorize_and_get_view_dom_id() -> tuple[requests.Session | None, str | None]:
+    """Runs the handshake and reads view_dom_id from the landing page, caching the id for DOM_ID_TTL_SECONDS."""
+    global _DOM_ID_CACHE
+    session, landing_response = _solve_challenge_and_get_session()
+    if not session:
+        return None, None
+    view_dom_id = _extract_view_dom_id(session, landing_response)
+    if view_dom_id:
+        _DOM_ID_CACHE = (view_dom_id, time.time() + DOM_ID_TTL_SECONDS)
+    return session, view_dom_id
+
+def _fragment(html_snippet: str):
+    """Parses a table cell's HTML into an lxml element wrapped in a <div>."""
+    return lxml.html.fragment_fromstring(html_snippet or '', create_parent='div')
+
+def _fragments(html_snippets: list) -> list:
+    """Parses many cells with a single lxml call; each result is equivalent to _fragment(snippet)."""
+    wrapped = "".join(f'<div data-cell="{i}">{snippet}</div>' for i, snippet in enumerate(html_snippets))
+    try:
+        cells = list(lxml.html.fragment_fromstring(f"<div>{wrapped}</div>"))
+    except etree.ParserError:
+        cells = []
+    # Stray closing tags inside a cell would break it out of its wrapper; re-parse one by one if that happened.
+    if len(cells) != len(html_snippets) or any(cell.get('data-cell') != str(i) or (cell.tail or '').strip() for i, cell in enumerate(cells)):
+        return [_fragment(snippet) for snippet in html_snippets]
+    return cells
+
+def _fragment_text(elem) -> str:
+    # Same output as BeautifulSoup's get_text(strip=True): each text node stripped, then joined.
+    return "".join(text.strip() for text in elem.itertext())
+
+def _match_cell(pattern: re.Pattern, cell):
+    return pattern.fullmatch(cell.strip()) if isinstance(cell, str) else None
+
+def _plain_text(cell) -> str | None:
+    """The stripped text of a cell with no tags or entities, which is what parsing it would give; None otherwise."""
+    if isinstance(cell, str) and '<' not in cell and '&' not in cell and '\r' not in cell:
+        return cell.strip()
+    return None
+
+def _cell_text(cell, tree=None) -> str:
+    plain = _plain_text(cell)
+    if plain is not None:
+        return plain
+    return _fragment_text(tree if tree is not None else _fragment(cell))
+
+def _cell_datetime(cell) -> str | None:
+    """The datetime attribute of the cell's first <time> tag, or None."""
+    match = _match_cell(_TIME_CELL_RE, cell)
+    if match:
+        return match.group(1)
+    if _plain_text(cell) is not None:
+        return None
+    datetimes = _FIRST_TIME_DATETIME_XPATH(_fragment(cell))
+    return datetimes[0] if datetimes else None
+
+def _parse_row(row: list, office_tree=None, subject_tree=None) -> dict | None:
+    """Turns one DataTables row (five HTML cells) into a letter record; None if the row is too short.
+    office_tree/subject_tree are columns 3 and 4 already parsed by _fragments, if available."""
+    if len(row) < 5:
+        return None
+
+    # Cells are tiny fragments: the usual shapes are matched by regex, anything else is parsed straight into lxml elements.
+    # Posted Date
+    posted_date = None
+    posted_datetime = _cell_datetime(row[0])
+    if posted_datetime is not None:
+        posted_date = posted_datetime[:10]
+    else:
+        # Fallback to text parsing
+        text_date = _cell_text(row[0])
+        try:
+            posted_date = datetime.strptime(text_date, "%m/%d/%Y").strftime("%Y-%m-%d")
+        except: pass
+
+    # Issue Date (Column 1)
+    # Note: The original script parsed this, keeping it for consistency
+    issue_datetime = _cell_datetime(row[1])
+    issue_date = issue_datetime[:10] if issue_datetime is not None else None
+
+    # Company Name & URL (Column 2)
+    anchor_match = _match_cell(_ANCHOR_CELL_RE, row[2])
+    if anchor_match:
+        href = html.unescape(anchor_match.group(1))
+        company_name = html.unescape(anchor_match.group(2)).strip()
+    elif isinstance(row[2], str) and '<' not in row[2]:
+        # No markup, so no link: the name is the raw cell, as below
+        href = None
+        company_name = row[2]
+    else:
+        anchors = _FIRST_ANCHOR_XPATH(_fragment(row[2]))
+        company_link = anchors[0] if anchors else None
+        company_name = _fragment_text(company_link) if company_link is not None else row[2]
+        href = company_link.get('href') if company_link is not None else None
+
+    letter_url = None
+    if href is not None:
+        letter_url = href if href.startswith("http") else f"{FDA_BASE_URL}{href}"
+
+    # Issuing Office (Column 3)
+    issuing_office = _cell_text(row[3], office_tree)
+
+    # Subject (Column 4)
+    subject = _cell_text(row[4], subject_tree)
+
+    return {
+        "posted_date": posted_date,
+        "issue_date": issue_date,
+        "company_name": company_name,
+        "issuing_office": issuing_office,
+        "subject": subject,
+        "letter_url": letter_url,
+    }
+
 def parse_fda_letters(api_response: dict) -> list:
     """Parses the JSON/HTML mix returned by the FDA API."""
     parsed_data = []
@@ -105,64 +196,33 @@ def parse_fda_letters(api_response: dict) -> list:
     elif isinstance(api_response, dict) and 'data' in api_response:
         raw_rows = api_response.get('data', [])
 
-    for row in raw_rows:
-        try:
-            if len(row) < 5: continue
-
-            # Use html.parser for Cloud Run compatibility (no lxml dependency issues)
-            soup_posted = BeautifulSoup(row[0], 'html.parser')
-            posted_time_tag = soup_posted.find('time')
-            
-            # Posted Date
-            posted_date = None
-            if posted_time_tag and posted_time_tag.has_attr('datetime'):
-                posted_date = posted_time_tag['datetime'].split('T')[0]
-            else:
-                # Fallback to text parsing
-                text_date = soup_posted.get_text(strip=True)
-                try:
-                    posted_date = datetime.strptime(text_date, "%m/%d/%Y").strftime("%Y-%m-%d")
-                except: pass
-
-            # Issue Date (Column 1)
-            # Note: The original script parsed this, keeping it for consistency
-            soup_issue = BeautifulSoup(row[1], 'html.parser')
-            issue_time_tag = soup_issue.find('time')
-            issue_date = None
-            if issue_time_tag and issue_time_tag.has_attr('datetime'):
-                issue_date = issue_time_tag['datetime'].split('T')[0]
-
-            # Company Name & URL (Column 2)
-            soup_company = BeautifulSoup(row[2], 'html.parser')
-            company_link = soup_company.find('a')
-            company_name = company_link.get_text(strip=True) if company_link else row[2]
-            
-            letter_url = None
-            if company_link and company_link.has_attr('href'):
-                href = company_link['href']
-                letter_url = href if href.startswith("http") else f"{FDA_BASE_URL}{href}"
+    # Columns 3 and 4 are free text with no fixed shape; the ones carrying markup are parsed together in one lxml call.
+    text_cells = {}
+    for r, row in enumerate(raw_rows):
+        if isinstance(row, list) and len(row) >= 5:
+            text_cells.update(((r, c), row[c]) for c in (3, 4) if isinstance(row[c], str) and _plain_text(row[c]) is None)
+    trees = dict(zip(text_cells, _fragments(list(text_cells.values()))))
 
-            # Issuing Office (Column 3)
-            issuing_office = BeautifulSoup(row[3], 'html.parser').get_text(strip=True)
-
-            # Subject (Column 4)
-            subject = BeautifulSoup(row[4], 'html.parser').get_text(strip=True)
-            
-            record = {
-                "posted_date": posted_date,
-                "issue_date": issue_date,
-                "company_name": company_name,
-                "issuing_office": issuing_office,
-                "subject": subject,
-                "letter_url": letter_url,
-            }
-            parsed_data.append(record)
+    for r, row in enumerate(raw_rows):
+        try:
+            record = _parse_row(row, trees.get((r, 3)), trees.get((r, 4)))
         except Exception:
             # Silent skip for malformed rows
             continue
+        if record is not None:
+            parsed_data.append(record)
             
     return parsed_data
 
+def _decode_ajax_response(response: requests.Response):
+    """The decoded AJAX body, or None if the endpoint refused the request: a 4xx, the challenge page served with a 200, or a non-JSON body."""
+    if 400 <= response.status_code < 500 or b"abuse-deterrent.js" in response.content[:8192]:
+        return None
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return None
+
 # --- MAIN FUNCTION ---
 def check_for_updates(days_to_check: int = 7):
     """
@@ -174,23 +234,23 @@ def check_for_updates(days_to_check: int = 7):
     """
     logging.info(f"Starting FDA letter update check (Last {days_to_check} days).")
     
-    # 1. Initialize Session (with Solver)
-    session = _solve_challenge_and_get_session()
-    if not session:
-        logging.error("FDA check failed: Could not initialize authorized session.")
-        return None
+    global _DOM_ID_CACHE
 
-    # 2. Get Dynamic ID
-    view_dom_id = _extract_view_dom_id(session)
+    # 1./2. Initialize Session (with Solver) and get Dynamic ID
+    # A recent check already authorized the shared session and read the ID, so the landing page is not fetched again.
+    cached = _DOM_ID_CACHE
+    used_cached_id = cached is not None and cached[1] > time.time()
+    if used_cached_id:
+        session, view_dom_id = _SESSION, cached[0]
+        logging.info(f"Reusing cached view_dom_id: {view_dom_id}")
+    else:
+        session, view_dom_id = _authorize_and_get_view_dom_id()
+        if not session:
+            logging.error("FDA check failed: Could not initialize authorized session.")
+            return None
     
     # 3. Prepare API Request
-    # We ensure headers match what a browser sends after the initial load
-    session.headers.update({
-        'X-Requested-With': 'XMLHttpRequest',
-        'Referer': FDA_WL_PAGE_URL,
-        'Origin': FDA_BASE_URL
-    })
-
+    # AJAX_HEADERS match what a browser sends after the initial load
     params = {
         'field_change_date_2': '2', # '2' = Last 30 Days (hardcoded filter on server side)
         'length': '100',            # Fetch 100 items (usually sufficient for weekly checks)
@@ -199,7 +259,7 @@ def check_for_updates(days_to_check: int = 7):
         'view_name': 'warning_letter_solr_index',
         'view_path': '/inspections-compliance-enforcement-and-criminal-investigations/compliance-actions-and-activities/warning-letters',
         '_drupal_ajax': '1',
-        '_': int(time.time() * 1000)
+        '_': time.time_ns() // 1_000_000
     }
     if view_dom_id:
         params['view_dom_id'] = view_dom_id
@@ -207,21 +267,39 @@ def check_for_updates(days_to_check: int = 7):
     # 4. Fetch Data
     try:
         logging.info("Fetching data from FDA AJAX endpoint...")
-        response = session.get(FDA_AJAX_URL, params=params, timeout=60)
-        response.raise_for_status()
-        json_content = response.json()
+        response = session.get(FDA_AJAX_URL, params=params, headers=AJAX_HEADERS, timeout=60)
+        json_content = _decode_ajax_response(response) if used_cached_id else None
+        if used_cached_id and json_content is None:
+            # The cached ID or cookies went stale: redo the handshake and landing page read, then retry once.
+            logging.warning(f"FDA AJAX endpoint rejected cached view_dom_id (status {response.status_code}). Refreshing session.")
+            _DOM_ID_CACHE = None
+            session, view_dom_id = _authorize_and_get_view_dom_id()
+            if not session:
+                logging.error("FDA check failed: Could not initialize authorized session.")
+                return None
+            params.pop('view_dom_id', None)
+            if view_dom_id:
+                params['view_dom_id'] = view_dom_id
+            response = session.get(FDA_AJAX_URL, params=params, headers=AJAX_HEADERS, timeout=60)
+        if json_content is None:
+            response.raise_for_status()
+            json_content = orjson.loads(response.content)
     except Exception as e:
         logging.error(f"FDA API request failed: {e}")
+        # Make the next check start from a full handshake instead of the ID that may have caused this.
+        if used_cached_id:
+            _DOM_ID_CACHE = None
         return None
 
     # 5. Parse Data
     all_recent_letters = parse_fda_letters(json_content)
     
     # 6. Filter by requested days (Logic from original script)
-    cutoff_date = datetime.now() - timedelta(days=days_to_check)
+    # posted_date is always ISO (YYYY-MM-DD), which sorts the same as a string and as a date, so no strptime per letter.
+    cutoff_str = (datetime.now() - timedelta(days=days_to_check)).strftime("%Y-%m-%d")
     filtered_letters = [
         letter for letter in all_recent_letters
-        if letter.get("posted_date") and datetime.strptime(letter.get("posted_date"), "%Y-%m-%d").date() >= cutoff_date.date()
+        if letter.get("posted_date") and letter["posted_date"] >= cutoff_str
     ]
 
     logging.info(f"FDA check complete. Found {len(filtered_letters)} letters in the last {days_to_check} days.")
@@ -241,12 +319,12 @@ if __name__ == "__main__":
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"fda_letters_{timestamp}.json"
         
-        with open(os.path.join(output_dir, filename), "w") as f:
-            json.dump(result_package, f, indent=4)
+        with open(os.path.join(output_dir, filename), "wb") as f:
+            f.write(orjson.dumps(result_package, option=orjson.OPT_INDENT_2))
         logging.info(f"Saved package to {os.path.join(output_dir, filename)}")
         
         # Print sample
         if len(result_package['data']) > 0:
-            print(json.dumps(result_package['data'][0], indent=2))
+            print(orjson.dumps(result_package['data'][0], option=orjson.OPT_INDENT_2).decode())
     else:
         logging.error("Test run failed or found no records.")
\ No newline at end of file
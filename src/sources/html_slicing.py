@@ -0,0 +1,16 @@
+def slice_table(html_content: str, marker: str) -> str:
+    """Narrows the page to the <table> whose start tag contains `marker`, so lxml only builds that subtree."""
+    marker_idx = html_content.find(marker)
+    start = html_content.rfind('<table', 0, marker_idx) if marker_idx != -1 else -1
+    if start == -1 or '>' in html_content[start:marker_idx]:
+        return html_content
+
+    # Walk past nested tables so the slice ends at this table's own closing tag.
+    open_tables, cursor = 1, start + len('<table')
+    while open_tables:
+        close_idx = html_content.find('</table>', cursor)
+        if close_idx == -1:
+            return html_content
+        open_tables += html_content.count('<table', cursor, close_idx) - 1
+        cursor = close_idx + len('</table>')
+    return html_content[start:cursor]
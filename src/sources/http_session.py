@@ -0,0 +1,11 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+def make_session(headers: dict | None = None) -> requests.Session:
+    """A session for a source's module-level _SESSION: pooled keep-alive connections reused across polls, transient 5xx retried with backoff."""
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=5, status_forcelist=[500, 502, 503, 504])))
+    return session